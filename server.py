@@ -1,35 +1,70 @@
 #!/usr/bin/env python3
 """
 Voice Chat Server - Bidirectional with SQLite DB
-Full conversation persistence + real-time polling
+Full conversation persistence + real-time WebSocket push
 """
 
 import asyncio
+import atexit
+import collections
+import contextlib
 import json
+import logging
+import logging.handlers
 import os
+import queue
+import re
 import ssl
 import sys
-import tempfile
-import subprocess
 import datetime
+import gzip
+import hashlib
+import io
+import itertools
 import sqlite3
-import urllib.request
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-voice_env_path = Path(__file__).parent.parent / "voice-env" / "lib" / "python3.12" / "site-packages"
-sys.path.insert(0, str(voice_env_path))
+# Size the OpenMP/BLAS pools before numpy and CTranslate2 load them; in containers
+# the default is often the host's core count, which oversubscribes the CPU quota
+for _var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+    os.environ.setdefault(_var, str(min(8, os.cpu_count() or 1)))
 
+import aiohttp
+import numpy as np
+import orjson
 from aiohttp import web
 
 # Configuration
-HOST = "0.0.0.0"
 PORT = 10010
 SSL_CERT = Path(__file__).parent / "ssl" / "cert.pem"
 SSL_KEY = Path(__file__).parent / "ssl" / "key.pem"
-WHISPER_MODEL = "tiny"
+SERVE_TLS = os.environ.get("SERVE_TLS", "1") != "0"  # 0 when a front proxy terminates TLS
+# Plain HTTP stays on loopback unless HOST says otherwise — only the proxy should reach it
+HOST = os.environ.get("HOST", "0.0.0.0" if SERVE_TLS else "127.0.0.1")
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base.en")  # English-only; small.en for more accuracy
+WHISPER_COMPUTE = os.environ.get("WHISPER_COMPUTE")  # default: int8 on CPU, int8_float16 on CUDA
+WHISPER_WORKERS = int(os.environ.get("WHISPER_WORKERS", "2"))  # concurrent batches; raise for many clients
+# CTranslate2 starts workers x threads; split the OMP budget so they don't oversubscribe the CPU
+WHISPER_THREADS = int(os.environ.get("WHISPER_THREADS",
+                                     max(1, int(os.environ['OMP_NUM_THREADS']) // WHISPER_WORKERS)))
+WHISPER_BATCH_WINDOW = 0.02  # seconds to wait for concurrent clips to join a batch
+WHISPER_MAX_BATCH = 8
+# Greedy English decoding: skips language detection and beam search. Timestamp tokens are
+# skipped too — every batch entry is a single window of a single clip, so text is mapped
+# back to its clip by position and never needs them
+WHISPER_OPTIONS = dict(language='en', beam_size=1, without_timestamps=True)
+WHISPER_VAD_PARAMETERS = dict(min_silence_duration_ms=300)
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+# Clips quieter or shorter than this are answered as silence without touching Whisper
+SILENCE_RMS = 0.005
+MIN_CLIP_SECONDS = 0.3
 LOG_FILE = Path(__file__).parent / "voice-chat.log"
 DB_FILE = Path(__file__).parent / "voice-chat.db"
 AUDIO_DIR = Path(__file__).parent / "audio"
+TTS_VOICE = "en-GB-RyanNeural"
 
 # OpenClaw webhook
 OPENCLAW_HOST = os.environ.get("OPENCLAW_HOST", "127.0.0.1")
@@ -42,177 +77,507 @@ AUDIO_DIR.mkdir(exist_ok=True)
 # Timing log for detailed performance tracking
 TIMING_LOG = Path(__file__).parent / "timing.log"
 
+def _queue_logger(name, path, console_format):
+    """Logger whose lines are written to `path` and stdout by a background listener thread"""
+    records = queue.SimpleQueue()
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(console_format))
+    # WatchedFileHandler reopens the file if it is removed (see /timing/clear)
+    listener = logging.handlers.QueueListener(records, logging.handlers.WatchedFileHandler(path), console)
+    listener.start()
+    atexit.register(listener.stop)
+    return logger
+
+_message_log = _queue_logger("voice-chat", LOG_FILE, "%(message)s")
+_timing_log = _queue_logger("voice-chat.timing", TIMING_LOG, "⏱️ %(message)s")
+
 def log_message(direction, message):
     timestamp = datetime.datetime.now().isoformat()
-    with open(LOG_FILE, 'a') as f:
-        f.write(f"[{timestamp}] {direction}: {message}\n")
-    print(f"[{timestamp}] {direction}: {message}")
+    _message_log.info(f"[{timestamp}] {direction}: {message}")
 
 def log_timing(request_id, step, details=""):
     """Log timing for performance analysis"""
     ts = datetime.datetime.now()
     timestamp = ts.isoformat()
     ms = int(ts.timestamp() * 1000)
-    entry = f"{timestamp} | {ms} | req:{request_id} | {step} | {details}"
-    with open(TIMING_LOG, 'a') as f:
-        f.write(entry + "\n")
-    print(f"⏱️ {entry}")
+    _timing_log.info(f"{timestamp} | {ms} | req:{request_id} | {step} | {details}")
+
+def tail_lines(path, n):
+    """Last `n` lines of a log file, read in one streaming pass"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return [line.rstrip('\n') for line in collections.deque(f, maxlen=n) if line.strip()]
 
 # ============ DATABASE ============
 
+# One writer connection behind a lock (SQLite serializes writers anyway) and a small
+# pool of read-only connections; under WAL, readers never wait for the writer
+DB_READERS = 4
+_WRITER = None
+_WRITE_LOCK = threading.Lock()
+_READERS = queue.Queue()
+
+# The most recent messages, newest last; poll and history are served from here
+# and only fall back to SQLite for ids that have already rotated out
+RECENT_SIZE = 500
+RECENT = collections.deque(maxlen=RECENT_SIZE)
+RECENT_LOCK = threading.Lock()
+
+# Statements are kept as constants so every call hits the connection's prepared-statement cache
+INSERT_MSG_SQL = 'INSERT INTO messages (timestamp, direction, text, audio_path, delivered) VALUES (?, ?, ?, ?, 0)'
+MARK_DELIVERED_SQL = 'UPDATE messages SET delivered = 1 WHERE id = ?'
+
+DB_PRAGMAS = '''
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA mmap_size=268435456;
+'''
+
 def init_db():
-    """Initialize SQLite database"""
-    conn = sqlite3.connect(str(DB_FILE))
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            direction TEXT NOT NULL,
-            text TEXT NOT NULL,
-            audio_path TEXT,
-            delivered INTEGER DEFAULT 0
+    """Initialize SQLite database, the writer connection and the reader pool"""
+    global _WRITER
+    _WRITER = sqlite3.connect(str(DB_FILE), check_same_thread=False, isolation_level=None)
+    _WRITER.executescript('''
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+    ''' + DB_PRAGMAS)
+    with _WRITE_LOCK:
+        _WRITER.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                text TEXT NOT NULL,
+                audio_path TEXT,
+                delivered INTEGER DEFAULT 0
+            )
+        ''')
+        # Reads all go by id, which is the rowid: the table b-tree already serves
+        # them as a range scan, so no secondary index is needed for the poll query
+        _WRITER.execute('DROP INDEX IF EXISTS idx_timestamp')
+        _WRITER.execute('CREATE INDEX IF NOT EXISTS idx_delivered ON messages(delivered)')
+    
+    for _ in range(DB_READERS):
+        conn = sqlite3.connect(f"{DB_FILE.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(DB_PRAGMAS)
+        _READERS.put(conn)
+    
+    with _reader() as conn:
+        cursor = conn.execute(
+            'SELECT id, timestamp, direction, text, audio_path FROM messages ORDER BY id DESC LIMIT ?',
+            (RECENT_SIZE,)
         )
-    ''')
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON messages(timestamp)')
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_delivered ON messages(delivered)')
-    conn.commit()
-    conn.close()
+        RECENT.extend(reversed([dict(row) for row in cursor.fetchall()]))
     log_message("DB", "Database initialized")
 
+@contextlib.contextmanager
+def _reader():
+    """Borrow a read-only connection from the pool"""
+    conn = _READERS.get()
+    try:
+        yield conn
+    finally:
+        _READERS.put(conn)
+
 def db_insert_message(direction, text, audio_path=None):
     """Insert a message into the database"""
-    conn = sqlite3.connect(str(DB_FILE))
     timestamp = datetime.datetime.now().isoformat()
-    cursor = conn.execute(
-        'INSERT INTO messages (timestamp, direction, text, audio_path, delivered) VALUES (?, ?, ?, ?, ?)',
-        (timestamp, direction, text, audio_path, 0)
-    )
-    msg_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with _WRITE_LOCK:
+        cursor = _WRITER.execute(INSERT_MSG_SQL, (timestamp, direction, text, audio_path))
+        msg_id = cursor.lastrowid
+    message = {'id': msg_id, 'timestamp': timestamp, 'direction': direction,
+               'text': text, 'audio_path': audio_path}
+    with RECENT_LOCK:
+        RECENT.append(message)
+    publish_message(message)
     return msg_id
 
 def db_get_messages_since(since_id=0, limit=50):
     """Get messages since a given ID"""
-    conn = sqlite3.connect(str(DB_FILE))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.execute(
-        'SELECT id, timestamp, direction, text, audio_path FROM messages WHERE id > ? ORDER BY id ASC LIMIT ?',
-        (since_id, limit)
-    )
-    messages = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with RECENT_LOCK:
+        # Complete if nothing has rotated out yet, or the caller is past the oldest entry
+        if len(RECENT) < RECENT_SIZE or since_id >= RECENT[0]['id']:
+            return [m for m in RECENT if m['id'] > since_id][:limit]
+    
+    with _reader() as conn:
+        cursor = conn.execute(
+            'SELECT id, timestamp, direction, text, audio_path FROM messages WHERE id > ? ORDER BY id ASC LIMIT ?',
+            (since_id, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+def db_get_recent_messages(limit=20):
+    """Get the last `limit` messages, oldest first"""
+    with RECENT_LOCK:
+        if limit <= len(RECENT) or len(RECENT) < RECENT_SIZE:
+            return list(RECENT)[-limit:] if limit > 0 else []
+    
+    with _reader() as conn:
+        cursor = conn.execute(
+            'SELECT id, timestamp, direction, text, audio_path FROM messages ORDER BY id DESC LIMIT ?',
+            (limit,)
+        )
+        messages = [dict(row) for row in cursor.fetchall()]
+    messages.reverse()
     return messages
 
-def db_mark_delivered(msg_id):
-    """Mark a message as delivered"""
-    conn = sqlite3.connect(str(DB_FILE))
-    conn.execute('UPDATE messages SET delivered = 1 WHERE id = ?', (msg_id,))
-    conn.commit()
-    conn.close()
+def db_dump_messages(limit=50):
+    """Get the last `limit` rows with every column (debug viewer)"""
+    with _reader() as conn:
+        cursor = conn.execute('SELECT * FROM messages ORDER BY id DESC LIMIT ?', (limit,))
+        return [dict(row) for row in cursor.fetchall()]
+
+def db_mark_delivered(msg_ids):
+    """Mark messages as delivered"""
+    with _WRITE_LOCK:
+        # One transaction for the whole batch; in autocommit mode each row would commit on its own
+        _WRITER.execute('BEGIN IMMEDIATE')
+        try:
+            _WRITER.executemany(MARK_DELIVERED_SQL, [(i,) for i in msg_ids])
+        except Exception:
+            _WRITER.execute('ROLLBACK')
+            raise
+        _WRITER.execute('COMMIT')
+
+# ============ PUSH ============
+
+POLL_TIMEOUT = 25  # seconds a long-poll waits for a new message
+
+_subscribers = set()
+_event_loop = None
+_new_message = None  # set (and replaced) whenever a message is stored; wakes long-polls
+
+def _fanout(message):
+    global _new_message
+    for subscriber in _subscribers:
+        subscriber.put_nowait(message)
+    _new_message.set()
+    _new_message = asyncio.Event()
+
+def publish_message(message):
+    """Push a stored message to every WebSocket client and waiting long-poll.
+    Safe to call from any thread."""
+    if _event_loop is not None:
+        _event_loop.call_soon_threadsafe(_fanout, message)
+
+async def start_push(app):
+    global _event_loop, _new_message
+    _event_loop = asyncio.get_running_loop()
+    _new_message = asyncio.Event()
 
 # ============ OPENCLAW INTEGRATION ============
 
-def call_main_session(text, msg_id):
-    """Send voice message to OpenClaw main session and get response.
-    This goes through the real Jarvis with full memory, personality, and context."""
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+async def stream_main_session(session, text, msg_id):
+    """Send voice message to OpenClaw main session and stream the response back
+    one sentence at a time. This goes through the real Jarvis with full memory,
+    personality, and context."""
     
+    buffer = ''
+    produced = False
     try:
         log_timing(str(msg_id), "MAIN_SESSION_START", "sending to main session")
         
         url = f"http://{OPENCLAW_HOST}:{OPENCLAW_PORT}/v1/chat/completions"
-        data = json.dumps({
+        payload = {
             "model": "agent:main",
             "user": "main",
+            "stream": True,
             "messages": [
                 {
                     "role": "user",
                     "content": f"[🎤 Voice Message #{msg_id}] The user sent a voice message through the voice chat app. Respond concisely (1-3 sentences) — this will be converted to speech by the app's own TTS engine. Do NOT use the tts tool. Do NOT include MEDIA: tags. Just reply with plain text.\n\nThey said: \"{text}\""
                 }
             ]
-        }).encode('utf-8')
-        
-        req = urllib.request.Request(url, data=data, method='POST')
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('Authorization', f'Bearer {OPENCLAW_TOKEN}')
+        }
         
-        with urllib.request.urlopen(req, timeout=120) as response:
-            result = json.loads(response.read().decode())
-            response_text = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            
-            if response_text:
-                log_timing(str(msg_id), "MAIN_SESSION_DONE", f"response: {response_text[:50]}...")
-                return response_text
+        async with session.post(url, json=payload, headers={'Authorization': f'Bearer {OPENCLAW_TOKEN}'}) as response:
+            response.raise_for_status()
+            if response.content_type == 'application/json':
+                # Endpoint ignored "stream" and answered in one piece; split below
+                result = await response.json()
+                buffer = (result.get('choices') or [{}])[0].get('message', {}).get('content') or ''
             else:
-                log_message("ERROR", f"Empty response from main session")
-                return None
+                async for line in response.content:
+                    line = line.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    choices = json.loads(data).get('choices')
+                    if not choices:
+                        continue  # e.g. a trailing usage frame
+                    buffer += choices[0].get('delta', {}).get('content') or ''
+                    *sentences, buffer = SENTENCE_END.split(buffer)
+                    for sentence in sentences:
+                        produced = True
+                        yield sentence
+        
+        log_timing(str(msg_id), "MAIN_SESSION_DONE", "response complete")
             
     except Exception as e:
         log_message("ERROR", f"Main session call failed: {e}")
-        return None
+    
+    if buffer.strip():
+        # The unterminated last sentence, or the whole reply from the JSON fallback
+        for sentence in SENTENCE_END.split(buffer.strip()):
+            yield sentence
+    elif not produced:
+        log_message("ERROR", "Empty response from main session")
 
-def process_voice_message(text, msg_id):
-    """Process voice message: send to main session, get response, generate TTS.
-    Generates TTS first using msg_id as filename hint, then inserts complete row."""
+async def process_voice_message(session, text, msg_id, on_sentence=None, on_reply=None):
+    """Process voice message: stream the main session's response and voice it per sentence.
+    TTS for each sentence starts as soon as it arrives; rows are inserted in order,
+    each complete with its audio. on_sentence(seq, sentence) is awaited as each sentence
+    arrives, on_reply(seq, id, audio_path) once its row is inserted."""
     
-    # Send to main session (the real Jarvis)
-    response = call_main_session(text, msg_id)
+    pending = asyncio.Queue()
     
-    if response:
-        # Generate TTS BEFORE inserting to DB (use user msg_id for temp filename)
-        log_timing(str(msg_id), "14_TTS_START", "generating voice")
-        temp_name = f"jarvis_r{msg_id}"
-        audio_path = generate_tts(response, temp_name)
-        log_timing(str(msg_id), "15_TTS_DONE", f"audio: {audio_path}")
-        
-        # Insert complete row with audio — poll always sees it with audio ready
-        log_timing(str(msg_id), "12_DB_INSERT_START", "inserting jarvis msg with audio")
-        response_id = db_insert_message('jarvis', response, audio_path=audio_path)
-        log_timing(str(msg_id), "13_DB_INSERT_DONE", f"msg_id: {response_id}")
-        
-        log_timing(str(msg_id), "16_READY_FOR_POLL", "response ready with audio")
-        log_message("JARVIS", f"#{response_id}: {response[:50]}...")
-        return response_id
+    async def insert_in_order():
+        response_ids = []
+        while (item := await pending.get()) is not None:
+            seq, sentence, tts = item
+            audio_path = await tts
+            log_timing(str(msg_id), "15_TTS_DONE", f"audio: {audio_path}")
+            
+            # Insert complete row with audio — clients always see it with audio ready
+            log_timing(str(msg_id), "12_DB_INSERT_START", "inserting jarvis msg with audio")
+            response_id = db_insert_message('jarvis', sentence, audio_path=audio_path)
+            log_timing(str(msg_id), "13_DB_INSERT_DONE", f"msg_id: {response_id}")
+            
+            log_timing(str(msg_id), "16_READY_FOR_POLL", "response ready with audio")
+            log_message("JARVIS", f"#{response_id}: {sentence[:50]}...")
+            response_ids.append(response_id)
+            if on_reply:
+                await on_reply(seq, response_id, audio_path)
+        return response_ids
+    
+    inserter = asyncio.create_task(insert_in_order())
+    try:
+        # Send to main session (the real Jarvis); voice each sentence as it arrives
+        seq = 0
+        async for sentence in stream_main_session(session, text, msg_id):
+            log_timing(str(msg_id), "14_TTS_START", f"generating voice: {sentence[:30]}...")
+            tts = asyncio.create_task(generate_tts(sentence, uuid.uuid4().hex))
+            pending.put_nowait((seq, sentence, tts))
+            if on_sentence:
+                await on_sentence(seq, sentence)
+            seq += 1
+    finally:
+        pending.put_nowait(None)
     
-    return None
+    return await inserter
+
+async def start_http(app):
+    app['http'] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120))
+
+async def stop_http(app):
+    await app['http'].close()
 
 # ============ TTS ============
 
-def generate_tts(text, msg_id):
-    """Generate TTS audio for a response"""
+# Cached phrases (key -> audio/c_<key>.mp3), least recently used first. The key is
+# in the filename, so the index is rebuilt from the directory on startup.
+TTS_CACHE_SIZE = 512
+TTS_CACHE = collections.OrderedDict()
+
+def load_tts_cache():
+    for path in sorted(AUDIO_DIR.glob('c_*.mp3'), key=lambda p: p.stat().st_mtime):
+        TTS_CACHE[path.stem[2:]] = path
+    while len(TTS_CACHE) > TTS_CACHE_SIZE:
+        TTS_CACHE.popitem(last=False)[1].unlink(missing_ok=True)
+
+async def generate_tts(text, name):
+    """Generate TTS audio for a response (in-process, via edge-tts).
+    Audio is cached by (voice, text); a repeated phrase is just a hard link to the cached file."""
+    audio_filename = f"jarvis_{name}.mp3"
+    audio_path = AUDIO_DIR / audio_filename
+    key = hashlib.blake2b(f"{TTS_VOICE}|{text}".encode('utf-8'), digest_size=16).hexdigest()
     try:
-        audio_filename = f"jarvis_{msg_id}.mp3"
-        audio_path = AUDIO_DIR / audio_filename
-        
-        result = subprocess.run([
-            'npx', 'node-edge-tts',
-            '-t', text,
-            '-v', 'en-GB-RyanNeural',
-            '-f', str(audio_path),
-            '--timeout', '15000'
-        ], capture_output=True, timeout=30)
-        
-        if audio_path.exists():
-            log_message("TTS", f"Generated audio: {audio_filename}")
-            return f"/audio/{audio_filename}"
-        else:
-            log_message("ERROR", f"TTS failed: {result.stderr.decode()}")
-            return None
+        cache_path = TTS_CACHE.get(key)
+        if cache_path is not None:
+            try:
+                os.link(cache_path, audio_path)
+                os.utime(cache_path)  # mtime tracks last use, so load_tts_cache restores LRU order
+                TTS_CACHE.move_to_end(key)
+                log_message("TTS", f"Cache hit: {audio_filename}")
+                return f"/audio/{audio_filename}"
+            except FileNotFoundError:
+                # Cached file is gone from disk; forget it and synthesize again
+                TTS_CACHE.pop(key, None)
+        
+        import edge_tts
+        cache_path = AUDIO_DIR / f"c_{key}.mp3"
+        # Write under a private name and rename, so concurrent misses never see a partial file
+        partial_path = AUDIO_DIR / f"c_{key}.{name}.part"
+        try:
+            communicate = edge_tts.Communicate(text, TTS_VOICE)
+            await asyncio.wait_for(communicate.save(str(partial_path)), timeout=30)
+            os.replace(partial_path, cache_path)
+        finally:
+            partial_path.unlink(missing_ok=True)
+        log_message("TTS", f"Generated audio: {audio_filename}")
+        
+        TTS_CACHE[key] = cache_path
+        if len(TTS_CACHE) > TTS_CACHE_SIZE:
+            # Messages keep their own hard link, so evicting never breaks old audio
+            TTS_CACHE.popitem(last=False)[1].unlink(missing_ok=True)
+        
+        os.link(cache_path, audio_path)
+        return f"/audio/{audio_filename}"
     except Exception as e:
         log_message("ERROR", f"TTS error: {e}")
         return None
 
 # ============ WHISPER ============
 
+# Inference gets its own threads so it never queues behind DB reads or decoding
+# in the default executor; CTranslate2 releases the GIL while it runs
+WHISPER_POOL = ThreadPoolExecutor(max_workers=WHISPER_WORKERS, thread_name_prefix='whisper')
+
 _whisper_model = None
 def get_whisper_model():
     global _whisper_model
     if _whisper_model is None:
+        import ctranslate2
         from faster_whisper import WhisperModel
-        _whisper_model = WhisperModel(WHISPER_MODEL, device='cpu', compute_type='int8')
-        log_message("SYSTEM", f"Whisper '{WHISPER_MODEL}' loaded")
+        device = 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+        compute_type = WHISPER_COMPUTE or ('int8_float16' if device == 'cuda' else 'int8')
+        _whisper_model = WhisperModel(WHISPER_MODEL, device=device, compute_type=compute_type,
+                                      cpu_threads=WHISPER_THREADS, num_workers=WHISPER_WORKERS)
+        log_message("SYSTEM", f"Whisper '{WHISPER_MODEL}' loaded on {device} ({compute_type})")
     return _whisper_model
 
+def _speech_windows(audio):
+    """Speech region of one clip (Silero VAD), split into windows of at most 30s"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    speech = get_speech_timestamps(audio, VadOptions(**WHISPER_VAD_PARAMETERS))
+    if not speech:
+        return []
+    audio = audio[speech[0]['start']:speech[-1]['end']]
+    return [audio[i:i + 30 * 16000] for i in range(0, len(audio), 30 * 16000)]
+
+def _decode_windows(windows):
+    """Run windows through the encoder and decoder in batches of WHISPER_MAX_BATCH, one entry
+    per window. Entries never share a 30s context, so each text comes only from its own window."""
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    model = get_whisper_model()
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual,
+                          task='transcribe', language=WHISPER_OPTIONS['language'])
+    prompt = list(tokenizer.sot_sequence)
+    if WHISPER_OPTIONS['without_timestamps']:
+        prompt.append(tokenizer.no_timestamps)
+    
+    texts = []
+    for start in range(0, len(windows), WHISPER_MAX_BATCH):
+        batch = windows[start:start + WHISPER_MAX_BATCH]
+        features = np.stack([pad_or_trim(model.feature_extractor(window)[..., :-1]) for window in batch])
+        results = model.model.generate(model.encode(features), [prompt] * len(batch),
+                                       beam_size=WHISPER_OPTIONS['beam_size'], max_length=model.max_length,
+                                       suppress_blank=True, suppress_tokens=[-1])
+        if len(results) != len(batch):
+            raise RuntimeError(f"Whisper returned {len(results)} results for {len(batch)} windows")
+        texts.extend(tokenizer.decode(result.sequences_ids[0]).strip() for result in results)
+    return texts
+
+_transcribe_queue = None
+
+async def _run_batch(batch):
+    """Decode every window of every queued clip in one pass and hand each clip its own texts"""
+    windows = [window for clip_windows, _ in batch for window in clip_windows]
+    try:
+        texts = await asyncio.get_running_loop().run_in_executor(WHISPER_POOL, _decode_windows, windows)
+    except Exception as e:
+        texts = e
+    
+    start = 0
+    for clip_windows, future in batch:
+        end = start + len(clip_windows)
+        if not future.done():
+            if isinstance(texts, Exception):
+                future.set_exception(texts)
+            else:
+                future.set_result(' '.join(texts[start:end]).strip())
+        start = end
+
+async def _whisper_batcher():
+    """Collect clips arriving within a short window and decode their speech windows as one batch
+    (each window its own entry, at most WHISPER_MAX_BATCH per batch; a longer clip goes alone).
+    Up to WHISPER_WORKERS batches run at once; while all workers are busy, new clips
+    pile up in the queue and go out together in the next batch."""
+    loop = asyncio.get_running_loop()
+    workers = asyncio.Semaphore(WHISPER_WORKERS)
+    running = set()
+    held = None
+    while True:
+        await workers.acquire()
+        batch = [held or await _transcribe_queue.get()]
+        held = None
+        size = len(batch[0][0])
+        deadline = loop.time() + WHISPER_BATCH_WINDOW
+        while size < WHISPER_MAX_BATCH:
+            try:
+                item = await asyncio.wait_for(_transcribe_queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if size + len(item[0]) > WHISPER_MAX_BATCH:
+                held = item  # starts the next batch
+                break
+            batch.append(item)
+            size += len(item[0])
+        
+        task = asyncio.create_task(_run_batch(batch))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: workers.release())
+
+async def transcribe_audio(audio):
+    """Find the speech in a decoded clip, queue its windows for the Whisper batcher
+    and wait for the transcript ('' if there is no speech)"""
+    loop = asyncio.get_running_loop()
+    windows = await loop.run_in_executor(None, _speech_windows, audio)
+    if not windows:
+        return ''
+    future = loop.create_future()
+    await _transcribe_queue.put((windows, future))
+    return await future
+
+def decode_pcm(upload):
+    """Decode an uploaded clip to 16kHz mono float32 in-process (PyAV, via faster-whisper)"""
+    from faster_whisper import decode_audio
+    return decode_audio(upload)
+
+def warmup_whisper(barrier):
+    """Run one second of silence through Whisper so the first request skips kernel init.
+    The barrier holds each pool thread until all have one, so every worker gets warmed."""
+    with contextlib.suppress(threading.BrokenBarrierError):
+        barrier.wait(timeout=60)
+    _decode_windows([np.zeros(16000, dtype=np.float32)])
+
+async def start_whisper(app):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(WHISPER_POOL, get_whisper_model)
+    barrier = threading.Barrier(WHISPER_WORKERS)
+    await asyncio.gather(*(loop.run_in_executor(WHISPER_POOL, warmup_whisper, barrier)
+                           for _ in range(WHISPER_WORKERS)))
+    log_message("SYSTEM", "Whisper warm")
+
+async def start_whisper_batcher(app):
+    global _transcribe_queue
+    _transcribe_queue = asyncio.Queue()
+    app['whisper_batcher'] = asyncio.create_task(_whisper_batcher())
+
+async def stop_whisper_batcher(app):
+    app['whisper_batcher'].cancel()
+
 # ============ HTML CLIENT ============
 
 HTML_CLIENT = """
@@ -359,7 +724,6 @@ HTML_CLIENT = """
         let isListening = false;
         let stream = null;
         let lastMessageId = 0;
-        let pollInterval = null;
         let audioQueue = [];
         let isPlaying = false;
         let displayedMessageIds = new Set();
@@ -393,42 +757,56 @@ HTML_CLIENT = """
             });
         }
         
-        // Start polling
-        function startPolling() {
-            if (pollInterval) return;
-            pollInterval = setInterval(pollMessages, 400);
-            connEl.textContent = '● Connected';
-            connEl.className = 'online';
+        // Push channel: new messages arrive over a WebSocket
+        function connectPush() {
+            const proto = location.protocol === 'https:' ? 'wss' : 'ws';
+            const socket = new WebSocket(`${proto}://${location.host}/ws`);
+            socket.onopen = () => {
+                connEl.textContent = '● Connected';
+                connEl.className = 'online';
+                // Catch up on anything stored while disconnected
+                fetchMissed();
+            };
+            socket.onmessage = (e) => handleMessage(JSON.parse(e.data));
+            socket.onclose = () => {
+                connEl.textContent = '○ Offline';
+                connEl.className = 'offline';
+                setTimeout(connectPush, 1000);
+            };
         }
         
-        async function pollMessages() {
+        async function fetchMissed() {
             try {
-                const response = await fetch(`/api/poll?since=${lastMessageId}`);
+                const response = await fetch(`/api/poll?since=${lastMessageId}&wait=0`);
                 const data = await response.json();
-                
-                if (data.messages && data.messages.length > 0) {
-                    for (const msg of data.messages) {
-                        if (!displayedMessageIds.has(msg.id)) {
-                            if (msg.direction === 'jarvis') {
-                                setPipelineStep('thinking', 'done');
-                                setPipelineStep('tts', 'active');
-                                addMessage(msg.text, 'jarvis', msg.id);
-                                if (msg.audio_path) {
-                                    queueAudio(msg.audio_path, msg.id);
-                                }
-                            }
-                            displayedMessageIds.add(msg.id);
-                        }
-                        lastMessageId = Math.max(lastMessageId, msg.id);
+                for (const msg of data.messages || []) handleMessage(msg);
+            } catch (err) {
+                console.error('Catch-up error:', err);
+            }
+        }
+        
+        // Sentences /api/turn has already shown, keyed by text, until their row arrives
+        const pendingReplies = new Map();
+        
+        function handleMessage(msg) {
+            if (!displayedMessageIds.has(msg.id)) {
+                if (msg.direction === 'jarvis') {
+                    setPipelineStep('thinking', 'done');
+                    setPipelineStep('tts', 'active');
+                    const pending = pendingReplies.get(msg.text);
+                    if (pending) {
+                        pending.shift().dataset.id = msg.id;
+                        if (!pending.length) pendingReplies.delete(msg.text);
+                    } else {
+                        addMessage(msg.text, 'jarvis', msg.id);
+                    }
+                    if (msg.audio_path) {
+                        queueAudio(msg.audio_path, msg.id);
                     }
                 }
-                
-                connEl.textContent = '● Connected';
-                connEl.className = 'online';
-            } catch (err) {
-                connEl.textContent = '○ Offline';
-                connEl.className = 'offline';
+                displayedMessageIds.add(msg.id);
             }
+            lastMessageId = Math.max(lastMessageId, msg.id);
         }
         
         function queueAudio(audioPath, msgId) {
@@ -436,6 +814,32 @@ HTML_CLIENT = """
             playNextAudio();
         }
         
+        // Delivery acks are batched: flushed when the queue drains or after 500ms
+        let deliveredIds = [];
+        let deliveredTimer = null;
+        
+        function ackDelivered(id) {
+            deliveredIds.push(id);
+            if (audioQueue.length === 0) {
+                flushDelivered();
+            } else if (!deliveredTimer) {
+                deliveredTimer = setTimeout(flushDelivered, 500);
+            }
+        }
+        
+        function flushDelivered() {
+            clearTimeout(deliveredTimer);
+            deliveredTimer = null;
+            if (deliveredIds.length === 0) return;
+            const ids = deliveredIds;
+            deliveredIds = [];
+            fetch('/api/delivered', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ids })
+            });
+        }
+        
         async function playNextAudio() {
             if (isPlaying || audioQueue.length === 0) return;
             
@@ -453,7 +857,7 @@ HTML_CLIENT = """
                     audio.onerror = resolve;
                     setTimeout(resolve, 60000);
                 });
-                fetch(`/api/delivered/${id}`, { method: 'POST' });
+                ackDelivered(id);
             } catch (err) {
                 console.error('Audio error:', err);
             }
@@ -616,10 +1020,25 @@ HTML_CLIENT = """
             setPipelineStep('record', 'done');
             setPipelineStep('transcribe', 'active');
             
+            if (overMode) {
+                await transcribeToBuffer(blob);
+            } else {
+                // Immediate mode - whole turn over one streamed request.
+                // Not awaited: recording resumes while Jarvis answers.
+                runTurn(blob);
+            }
+            
+            if (isListening) {
+                statusEl.textContent = '🔴 Listening...';
+                statusEl.className = 'listening';
+            }
+        }
+        
+        async function transcribeToBuffer(blob) {
             try {
                 const formData = new FormData();
                 formData.append('audio', blob, 'recording.webm');
-                formData.append('buffer_mode', overMode ? '1' : '0');
+                formData.append('buffer_mode', '1');
                 
                 const response = await fetch('/api/transcribe', { method: 'POST', body: formData });
                 const data = await response.json();
@@ -629,30 +1048,72 @@ HTML_CLIENT = """
                 if (data.transcript && data.transcript !== '(silence)') {
                     const text = data.transcript.trim();
                     
-                    if (overMode) {
-                        // Check if user said "over"
-                        const lowerText = text.toLowerCase();
-                        if (lowerText.includes('over') && (lowerText.endsWith('over') || lowerText.endsWith('over.'))) {
-                            // Remove "over" and send
-                            const cleanText = text.replace(/\\s*over\\.?\\s*$/i, '').trim();
-                            if (cleanText) speechBuffer.push(cleanText);
-                            sendBufferedSpeech(reqId);
-                        } else {
-                            speechBuffer.push(text);
-                            updateBufferIndicator(text);
-                        }
+                    // Check if user said "over"
+                    const lowerText = text.toLowerCase();
+                    if (lowerText.includes('over') && (lowerText.endsWith('over') || lowerText.endsWith('over.'))) {
+                        // Remove "over" and send
+                        const cleanText = text.replace(/\\s*over\\.?\\s*$/i, '').trim();
+                        if (cleanText) speechBuffer.push(cleanText);
+                        sendBufferedSpeech(reqId);
                     } else {
-                        // Immediate mode - send right away
-                        await sendToServer(text, reqId);
+                        speechBuffer.push(text);
+                        updateBufferIndicator(text);
                     }
                 }
             } catch (err) {
                 console.error('Process error:', err);
             }
+        }
+        
+        async function runTurn(blob) {
+            const formData = new FormData();
+            formData.append('audio', blob, 'recording.webm');
+            const replies = {};
             
-            if (isListening) {
-                statusEl.textContent = '🔴 Listening...';
-                statusEl.className = 'listening';
+            try {
+                const response = await fetch('/api/turn', { method: 'POST', body: formData });
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let pending = '';
+                
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    pending += decoder.decode(value, { stream: true });
+                    const lines = pending.split('\\n');
+                    pending = lines.pop();
+                    for (const line of lines) {
+                        if (line.trim()) handleTurnFrame(JSON.parse(line), replies);
+                    }
+                }
+            } catch (err) {
+                console.error('Turn error:', err);
+                setPipelineStep('transcribe', 'error');
+            }
+        }
+        
+        function handleTurnFrame(frame, replies) {
+            if (frame.stage === 'transcript') {
+                setPipelineStep('transcribe', 'done');
+            } else if (frame.stage === 'user') {
+                setPipelineStep('send', 'done');
+                setPipelineStep('thinking', 'active');
+                addMessage(frame.text, 'user', frame.id);
+                displayedMessageIds.add(frame.id);
+                lastMessageId = Math.max(lastMessageId, frame.id);
+                showThinking();
+            } else if (frame.stage === 'reply') {
+                // Show the text now; its row (and audio) follows via the audio frame or push
+                replies[frame.seq] = frame.text;
+                setPipelineStep('thinking', 'done');
+                setPipelineStep('tts', 'active');
+                if (!pendingReplies.has(frame.text)) pendingReplies.set(frame.text, []);
+                pendingReplies.get(frame.text).push(addMessage(frame.text, 'jarvis', ''));
+            } else if (frame.stage === 'audio') {
+                handleMessage({ id: frame.id, direction: 'jarvis', text: replies[frame.seq], audio_path: frame.url });
+            } else if (frame.stage === 'error') {
+                console.error('Turn error:', frame.error);
+                setPipelineStep('transcribe', 'error');
             }
         }
         
@@ -736,6 +1197,7 @@ HTML_CLIENT = """
             div.textContent = prefix + text;
             transcriptEl.appendChild(div);
             transcriptEl.scrollTop = transcriptEl.scrollHeight;
+            return div;
         }
         
         async function loadHistory() {
@@ -758,71 +1220,117 @@ HTML_CLIENT = """
         
         toggleBtn.addEventListener('click', toggleListening);
         
-        loadHistory();
-        startPolling();
+        loadHistory().then(connectPush);
     </script>
 </body>
 </html>
 """
 
+# Encoded (and gzipped) once at import instead of on every page load
+_HTML_BYTES = HTML_CLIENT.encode('utf-8')
+_HTML_GZ = gzip.compress(_HTML_BYTES, 9)
+_HTML_HEADERS = {
+    'Content-Type': 'text/html; charset=utf-8',
+    'Cache-Control': 'public, max-age=300',
+    'Vary': 'Accept-Encoding',
+}
+_HTML_GZ_HEADERS = {**_HTML_HEADERS, 'Content-Encoding': 'gzip'}
+
 # ============ HTTP HANDLERS ============
 
+_background_tasks = set()
+REQ_COUNTER = itertools.count(1)
+
+def json_response(data, status=200):
+    """Like web.json_response, but encoded by orjson straight to bytes"""
+    return web.Response(body=orjson.dumps(data), status=status, content_type='application/json')
+
+def canned_json(data, status=200):
+    """Factory for a constant JSON reply: encoded once here, fresh Response per call"""
+    body = orjson.dumps(data)
+    return lambda: web.Response(body=body, status=status, content_type='application/json')
+
+ERR_UPLOAD_TOO_LARGE = canned_json({'error': 'Audio upload too large'}, status=413)
+ERR_CONVERSION_FAILED = canned_json({'error': 'Audio conversion failed'}, status=500)
+ERR_NO_TEXT = canned_json({'error': 'No text'}, status=400)
+ERR_NO_TEXT_PROVIDED = canned_json({'error': 'No text provided'}, status=400)
+ERR_BAD_IDS = canned_json({'error': 'Expected {"ids": [message ids]}'}, status=400)
+SILENCE = canned_json({'transcript': '(silence)'})
+NO_MESSAGES = canned_json({'messages': []})
+OK = canned_json({'ok': True})
+
 async def index(request):
-    return web.Response(text=HTML_CLIENT, content_type='text/html')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        return web.Response(body=_HTML_GZ, headers=_HTML_GZ_HEADERS)
+    return web.Response(body=_HTML_BYTES, headers=_HTML_HEADERS)
+
+async def read_audio_upload(request):
+    """Stream the first multipart field into memory chunk by chunk.
+    Returns a BytesIO ready for the decoder, or None once it grows past MAX_UPLOAD_BYTES
+    (client_max_size does not apply to streamed multipart bodies)."""
+    reader = await request.multipart()
+    field = await reader.next()
+    
+    upload = io.BytesIO()
+    while True:
+        chunk = await field.read_chunk()
+        if not chunk: break
+        upload.write(chunk)
+        if upload.tell() > MAX_UPLOAD_BYTES:
+            return None
+    upload.seek(0)
+    return upload
+
+async def transcribe_pcm(audio, req_id):
+    """Transcribe a decoded clip. Returns '' for silence"""
+    if len(audio) < MIN_CLIP_SECONDS * 16000 or np.sqrt(np.mean(audio ** 2)) < SILENCE_RMS:
+        log_timing(req_id, "4_WHISPER_SKIPPED", "silent clip")
+        return ''
+    
+    log_timing(req_id, "4_WHISPER_START", "transcribing")
+    transcript = await transcribe_audio(audio)
+    log_timing(req_id, "5_WHISPER_DONE", f"transcript: {transcript[:30]}...")
+    return transcript
 
 async def transcribe_handler(request):
     """Transcribe audio only (for buffer mode)"""
-    req_id = datetime.datetime.now().strftime("%H%M%S%f")[:10]
+    req_id = f"{next(REQ_COUNTER):08x}"
     try:
         log_timing(req_id, "1_AUDIO_RECEIVED", "audio chunk received")
         
-        reader = await request.multipart()
-        field = await reader.next()
-        
-        with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as f:
-            audio_path = f.name
-            while True:
-                chunk = await field.read_chunk()
-                if not chunk: break
-                f.write(chunk)
-        
-        log_timing(req_id, "2_FFMPEG_START", "converting to wav")
-        wav_path = audio_path.replace('.webm', '.wav')
-        subprocess.run(['ffmpeg', '-i', audio_path, '-ar', '16000', '-ac', '1', wav_path, '-y'],
-                      capture_output=True, timeout=10)
-        log_timing(req_id, "3_FFMPEG_DONE", "wav ready")
-        
-        if not os.path.exists(wav_path):
-            return web.json_response({'error': 'Audio conversion failed'}, status=500)
+        upload = await read_audio_upload(request)
+        if upload is None:
+            return ERR_UPLOAD_TOO_LARGE()
         
-        log_timing(req_id, "4_WHISPER_START", "transcribing")
-        model = get_whisper_model()
-        segments, _ = model.transcribe(wav_path, language='en')
-        transcript = ' '.join([s.text for s in segments]).strip()
-        log_timing(req_id, "5_WHISPER_DONE", f"transcript: {transcript[:30]}...")
+        log_timing(req_id, "2_DECODE_START", "decoding to 16kHz PCM")
+        try:
+            audio = await asyncio.get_running_loop().run_in_executor(None, decode_pcm, upload)
+        except Exception as e:
+            log_message("ERROR", f"Audio decode failed: {e}")
+            return ERR_CONVERSION_FAILED()
+        log_timing(req_id, "3_DECODE_DONE", "pcm ready")
         
-        os.unlink(audio_path)
-        os.unlink(wav_path)
+        transcript = await transcribe_pcm(audio, req_id)
         
         if not transcript:
-            return web.json_response({'transcript': '(silence)'})
+            return SILENCE()
         
         log_message("TRANSCRIBE", transcript)
-        return web.json_response({'transcript': transcript, 'req_id': req_id})
+        return json_response({'transcript': transcript, 'req_id': req_id})
         
     except Exception as e:
         log_message("ERROR", str(e))
-        return web.json_response({'error': str(e)}, status=500)
+        return json_response({'error': str(e)}, status=500)
 
 async def speak_handler(request):
     """Handle text from user (after transcription) - now with AUTO-RESPONSE"""
     try:
         data = await request.json()
         text = data.get('text', '').strip()
-        req_id = data.get('req_id', datetime.datetime.now().strftime("%H%M%S%f")[:10])
+        req_id = data.get('req_id') or f"{next(REQ_COUNTER):08x}"
         
         if not text:
-            return web.json_response({'error': 'No text'}, status=400)
+            return ERR_NO_TEXT()
         
         log_timing(req_id, "6_TEXT_RECEIVED", f"text: {text[:30]}...")
         log_message("USER", text)
@@ -833,57 +1341,115 @@ async def speak_handler(request):
         log_timing(req_id, "8_DB_INSERT_DONE", f"msg_id: {msg_id}")
         
         # Return immediately so the client can show the user message right away
-        # Process AI response in background thread
-        import threading
-        def background_respond():
+        # Process AI response in a background task
+        async def background_respond():
             try:
                 log_timing(req_id, "9_AI_START", "calling claude directly")
-                process_voice_message(text, msg_id)
+                await process_voice_message(request.app['http'], text, msg_id)
                 log_timing(req_id, "10_AI_DONE", "response ready")
             except Exception as e:
                 log_message("ERROR", f"Background respond failed: {e}")
         
-        threading.Thread(target=background_respond, daemon=True).start()
+        task = asyncio.create_task(background_respond())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        
+        return json_response({'message_id': msg_id, 'req_id': req_id})
+        
+    except Exception as e:
+        log_message("ERROR", str(e))
+        return json_response({'error': str(e)}, status=500)
+
+async def turn_handler(request):
+    """Whole voice turn over one connection: audio in, newline-delimited JSON out.
+    Emits transcript and user, then per sentence a reply frame as soon as its text
+    arrives and an audio frame once its voiced row is stored (both carry its seq)."""
+    req_id = f"{next(REQ_COUNTER):08x}"
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson',
+                                           'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})  # nginx: pass frames through
+    await response.prepare(request)
+    
+    async def send(frame):
+        try:
+            await response.write(orjson.dumps(frame) + b'\n')
+        except ConnectionResetError:
+            pass  # client went away; keep inserting so the turn still lands in history
+    
+    try:
+        log_timing(req_id, "1_AUDIO_RECEIVED", "turn audio received")
+        
+        upload = await read_audio_upload(request)
+        if upload is None:
+            await send({'stage': 'error', 'error': 'Audio upload too large'})
+            return response
+        
+        log_timing(req_id, "2_DECODE_START", "decoding to 16kHz PCM")
+        try:
+            audio = await asyncio.get_running_loop().run_in_executor(None, decode_pcm, upload)
+        except Exception as e:
+            log_message("ERROR", f"Audio decode failed: {e}")
+            await send({'stage': 'error', 'error': 'Audio conversion failed'})
+            return response
+        log_timing(req_id, "3_DECODE_DONE", "pcm ready")
+        
+        transcript = await transcribe_pcm(audio, req_id)
+        
+        await send({'stage': 'transcript', 'text': transcript or '(silence)', 'req_id': req_id})
+        if not transcript:
+            return response
+        
+        log_message("TRANSCRIBE", transcript)
+        log_message("USER", transcript)
+        log_timing(req_id, "7_DB_INSERT_START", "inserting user msg to db")
+        msg_id = db_insert_message('user', transcript)
+        log_timing(req_id, "8_DB_INSERT_DONE", f"msg_id: {msg_id}")
+        await send({'stage': 'user', 'id': msg_id, 'text': transcript})
+        
+        async def on_sentence(seq, sentence):
+            await send({'stage': 'reply', 'seq': seq, 'text': sentence})
         
-        return web.json_response({'message_id': msg_id, 'req_id': req_id})
+        async def on_reply(seq, response_id, audio_path):
+            await send({'stage': 'audio', 'seq': seq, 'id': response_id, 'url': audio_path})
+        
+        log_timing(req_id, "9_AI_START", "calling claude directly")
+        await process_voice_message(request.app['http'], transcript, msg_id,
+                                    on_sentence=on_sentence, on_reply=on_reply)
+        log_timing(req_id, "10_AI_DONE", "response ready")
         
     except Exception as e:
         log_message("ERROR", str(e))
-        return web.json_response({'error': str(e)}, status=500)
+        await send({'stage': 'error', 'error': str(e)})
+    finally:
+        with contextlib.suppress(ConnectionResetError):
+            await response.write_eof()
+    return response
 
 async def respond_handler(request):
     """API for Jarvis (OpenClaw) to send responses"""
-    req_id = datetime.datetime.now().strftime("%H%M%S%f")[:10]
+    req_id = f"{next(REQ_COUNTER):08x}"
     try:
         data = await request.json()
         text = data.get('text', '').strip()
         
         if not text:
-            return web.json_response({'error': 'No text provided'}, status=400)
+            return ERR_NO_TEXT_PROVIDED()
         
         log_timing(req_id, "11_RESPOND_RECEIVED", f"jarvis response: {text[:30]}...")
         
-        # Insert to DB
-        log_timing(req_id, "12_DB_INSERT_START", "inserting jarvis msg to db")
-        msg_id = db_insert_message('jarvis', text)
-        log_timing(req_id, "13_DB_INSERT_DONE", f"msg_id: {msg_id}")
-        
-        # Generate TTS
+        # Generate TTS first so the row is inserted complete, with its audio
         log_timing(req_id, "14_TTS_START", "generating voice")
-        audio_path = generate_tts(text, msg_id)
+        audio_path = await generate_tts(text, uuid.uuid4().hex)
         log_timing(req_id, "15_TTS_DONE", f"audio: {audio_path}")
         
-        # Update with audio path
-        if audio_path:
-            conn = sqlite3.connect(str(DB_FILE))
-            conn.execute('UPDATE messages SET audio_path = ? WHERE id = ?', (audio_path, msg_id))
-            conn.commit()
-            conn.close()
+        log_timing(req_id, "12_DB_INSERT_START", "inserting jarvis msg with audio")
+        msg_id = db_insert_message('jarvis', text, audio_path=audio_path)
+        log_timing(req_id, "13_DB_INSERT_DONE", f"msg_id: {msg_id}")
         
         log_timing(req_id, "16_READY_FOR_POLL", "response ready in db")
         log_message("JARVIS", f"#{msg_id}: {text[:50]}...")
         
-        return web.json_response({
+        return json_response({
             'ok': True,
             'message_id': msg_id,
             'audio_path': audio_path,
@@ -892,57 +1458,102 @@ async def respond_handler(request):
         
     except Exception as e:
         log_message("ERROR", f"Respond error: {e}")
-        return web.json_response({'error': str(e)}, status=500)
+        return json_response({'error': str(e)}, status=500)
+
+async def ws_handler(request):
+    """WebSocket push channel: sends each new message as it is stored"""
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    
+    subscriber = asyncio.Queue()
+    _subscribers.add(subscriber)
+    
+    async def pump():
+        try:
+            while True:
+                await ws.send_str(orjson.dumps(await subscriber.get()).decode())
+        except ConnectionResetError:
+            pass  # socket is closing; the receive loop below ends on its own
+    
+    sender = asyncio.create_task(pump())
+    try:
+        async for _ in ws:
+            pass
+    finally:
+        sender.cancel()
+        _subscribers.discard(subscriber)
+    return ws
 
 async def poll_handler(request):
-    """Poll for new messages"""
+    """Long-poll for new messages: answers at once if there are any, otherwise waits
+    up to POLL_TIMEOUT for the next one (?wait=0 returns immediately)"""
     since_id = int(request.query.get('since', 0))
-    messages = db_get_messages_since(since_id)
-    return web.json_response({'messages': messages})
+    loop = asyncio.get_running_loop()
+    # Grab the event before querying so a message stored in between still wakes us
+    new_message = _new_message
+    messages = await loop.run_in_executor(None, db_get_messages_since, since_id)
+    
+    if not messages and request.query.get('wait', '1') != '0':
+        try:
+            await asyncio.wait_for(new_message.wait(), timeout=POLL_TIMEOUT)
+            messages = await loop.run_in_executor(None, db_get_messages_since, since_id)
+        except asyncio.TimeoutError:
+            pass
+    if not messages:
+        return NO_MESSAGES()
+    return json_response({'messages': messages})
 
 async def history_handler(request):
     """Get recent message history"""
     limit = int(request.query.get('limit', 20))
-    conn = sqlite3.connect(str(DB_FILE))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.execute(
-        'SELECT id, timestamp, direction, text, audio_path FROM messages ORDER BY id DESC LIMIT ?',
-        (limit,)
-    )
-    messages = [dict(row) for row in cursor.fetchall()]
-    messages.reverse()
-    conn.close()
-    return web.json_response({'messages': messages})
+    messages = await asyncio.get_running_loop().run_in_executor(None, db_get_recent_messages, limit)
+    return json_response({'messages': messages})
 
 async def delivered_handler(request):
     """Mark message as delivered"""
     msg_id = int(request.match_info['id'])
-    db_mark_delivered(msg_id)
-    return web.json_response({'ok': True})
+    db_mark_delivered([msg_id])
+    return OK()
+
+async def delivered_batch_handler(request):
+    """Mark several messages as delivered ({"ids": [...]})"""
+    try:
+        data = await request.json()
+        ids = data.get('ids', []) if isinstance(data, dict) else None
+        if not isinstance(ids, list):
+            raise TypeError('expected {"ids": [...]}')
+        ids = [int(i) for i in ids]
+    except (ValueError, TypeError) as e:
+        log_message("ERROR", f"Bad delivered body: {e}")
+        return ERR_BAD_IDS()
+    
+    try:
+        db_mark_delivered(ids)
+    except Exception as e:
+        log_message("ERROR", str(e))
+        return json_response({'error': str(e)}, status=500)
+    return OK()
 
-async def serve_audio(request):
-    """Serve audio files"""
-    filename = request.match_info['filename']
-    filepath = AUDIO_DIR / filename
-    if filepath.exists():
-        return web.FileResponse(filepath)
-    return web.Response(status=404)
+@web.middleware
+async def audio_cache_headers(request, handler):
+    """Audio filenames are unique per message, so browsers may cache them forever"""
+    response = await handler(request)
+    if request.path.startswith('/audio/') and response.status in (200, 206):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response.headers['Accept-Ranges'] = 'bytes'
+    return response
 
 async def logs_handler(request):
     return web.FileResponse(LOG_FILE) if LOG_FILE.exists() else web.Response(text="No logs")
 
 async def db_viewer(request):
-    conn = sqlite3.connect(str(DB_FILE))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.execute('SELECT * FROM messages ORDER BY id DESC LIMIT 50')
-    messages = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return web.json_response({'messages': messages})
+    messages = await asyncio.get_running_loop().run_in_executor(None, db_dump_messages)
+    return json_response({'messages': messages})
 
 async def timing_viewer(request):
     """View timing logs"""
     if TIMING_LOG.exists():
-        lines = TIMING_LOG.read_text().strip().split('\n')[-50:]
+        lines = await asyncio.get_running_loop().run_in_executor(None, tail_lines, TIMING_LOG, 50)
         return web.Response(text='\n'.join(lines), content_type='text/plain')
     return web.Response(text="No timing logs yet")
 
@@ -958,28 +1569,53 @@ def main():
     log_message("SYSTEM", "Voice chat starting - BIDIRECTIONAL MODE v2")
     
     init_db()
-    get_whisper_model()
+    load_tts_cache()
     
-    app = web.Application(client_max_size=50*1024*1024)
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES, middlewares=[audio_cache_headers])
+    app.on_startup.append(start_push)
+    app.on_startup.append(start_http)
+    app.on_startup.append(start_whisper)
+    app.on_startup.append(start_whisper_batcher)
+    app.on_cleanup.append(stop_whisper_batcher)
+    app.on_cleanup.append(stop_http)
     
     app.router.add_get('/', index)
     app.router.add_post('/api/transcribe', transcribe_handler)
     app.router.add_post('/api/speak', speak_handler)
     app.router.add_post('/api/respond', respond_handler)
+    app.router.add_post('/api/turn', turn_handler)
     app.router.add_get('/api/poll', poll_handler)
+    app.router.add_get('/ws', ws_handler)
     app.router.add_get('/api/history', history_handler)
+    app.router.add_post('/api/delivered', delivered_batch_handler)
     app.router.add_post('/api/delivered/{id}', delivered_handler)
-    app.router.add_get('/audio/{filename}', serve_audio)
+    app.router.add_static('/audio/', path=str(AUDIO_DIR), show_index=False, append_version=False)
     app.router.add_get('/logs', logs_handler)
     app.router.add_get('/db', db_viewer)
     app.router.add_get('/timing', timing_viewer)
     app.router.add_post('/timing/clear', timing_clear)
     
-    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-    ssl_context.load_cert_chain(str(SSL_CERT), str(SSL_KEY))
+    if SERVE_TLS:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(str(SSL_CERT), str(SSL_KEY))
+        # TLS 1.3 only: one-round-trip handshakes and ticket-based resumption (on by default).
+        # aiohttp speaks HTTP/1.1 only, so that is the one protocol offered over ALPN.
+        ssl_context.minimum_version = ssl.TLSVersion.TLSv1_3
+        ssl_context.set_alpn_protocols(['http/1.1'])
+    else:
+        ssl_context = None
+    
+    scheme = 'https' if SERVE_TLS else 'http'
+    print(f"🦞 Jarvis Voice Chat v2 on {scheme}://{HOST}:{PORT}")
+    # uvloop is optional: a faster drop-in event loop when installed
+    try:
+        import uvloop
+        loop = uvloop.new_event_loop()
+    except ImportError:
+        loop = None
     
-    print(f"🦞 Jarvis Voice Chat v2 on https://{HOST}:{PORT}")
-    web.run_app(app, host=HOST, port=PORT, ssl_context=ssl_context)
+    web.run_app(app, host=HOST, port=PORT, ssl_context=ssl_context, access_log=None,
+                keepalive_timeout=75, backlog=512, loop=loop)
 
 if __name__ == '__main__':
     main()